@@ -1,3 +1,10 @@
+import asyncio
+
+try:
+    import uvloop
+except ImportError:  # uvloop no está disponible en Windows
+    uvloop = None
+
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
@@ -15,56 +22,71 @@ async def run():
         async with ClientSession(read, write) as session:
             await session.initialize()
 
+            """ consultas independientes: se envían todas a la vez """
+            (
+                prompts,
+                resources,
+                template_resources,
+                tools,
+                quote_resource,
+                person_resource,
+            ) = await asyncio.gather(
+                session.list_prompts(),
+                session.list_resources(),
+                session.list_resource_templates(),
+                session.list_tools(),
+                session.read_resource("got://quotes/random"),
+                session.read_resource("person://properties/alexys"),
+            )
+
+            """ ejecuta un prompt y una herramienta (dependen de los listados) """
+            prompt, tool_result = await asyncio.gather(
+                session.get_prompt(
+                    prompts.prompts[1].name,
+                    arguments={
+                        "code": "console.log('Hello, world!');"
+                    }
+                ),
+                session.call_tool(
+                    tools.tools[1].name,
+                    arguments={
+                        "numbers": [1, 2, 3, 4, 5]
+                    },
+                ),
+            )
+
             """  lista los prompts disponibles """
-            prompts = await session.list_prompts()
             print("Prompts:")
             print(prompts)
 
             """ ejecuta un prompt """
-            prompt = await session.get_prompt(
-                prompts.prompts[1].name,
-                arguments={
-                    "code": "console.log('Hello, world!');"
-                }
-            )
             print("Prompt:")
             print(prompt)
 
             """ listar los recursos disponibles """
-            resources = await session.list_resources()
             print("Resources:")
             print(resources)
             
             """ listar los recursos dinámicos disponibles """
-            template_resources = await session.list_resource_templates()
             print("Template Resources:")
             print(template_resources)
 
             """ obtener un recurso """
-            resource = await session.read_resource("got://quotes/random")
             print("Resource:")
-            print(resource)
+            print(quote_resource)
 
             """ obtener un recurso dinámico """
-            resource = await session.read_resource("person://properties/alexys")
             print("Resource:")
-            print(resource)
+            print(person_resource)
 
             """ listar las herramientas disponibles """
-            tools = await session.list_tools()
             print("Tools:")
             print(tools)
 
             """ ejecutar una herramienta """
-            tool_result = await session.call_tool(
-                tools.tools[1].name,
-                arguments={
-                    "numbers": [1, 2, 3, 4, 5]
-                },
-            )
             print("Tool Result:")
             print(tool_result)
     
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(run())
+    # uvloop reduce el coste de cada await en el transporte stdio
+    (uvloop.run if uvloop else asyncio.run)(run())
@@ -1,11 +1,20 @@
+import asyncio
+import json
 import logging
+import time
 from mcp import ClientSession, StdioServerParameters
+import mcp.types as types
 from mcp.client.stdio import stdio_client
-from typing import Optional, Dict, Any, Tuple, Union
+from memory_transport import INPROC_COMMAND, inprocess_client
+from stdio_transport import coalescing_stdio_client
+from typing import Optional, Dict, Any, Tuple
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Clientes compartidos por (comando, argumentos, entorno): un solo subproceso por servidor
+_MCP_POOL: Dict[Tuple, 'MCPClient'] = {}
+
 class MCPClient:
     """
     Cliente para interactuar con servidores MCP (Model Control Protocol).
@@ -24,14 +33,28 @@ class MCPClient:
         ```
     """
     
-    def __init__(self, command: str, args: list[str], env: Optional[Dict[str, str]] = None):
+    def __init__(
+        self,
+        command: str,
+        args: list[str],
+        env: Optional[Dict[str, str]] = None,
+        cache_ttl_seconds: float = 60.0,
+        keepalive_interval: Optional[float] = None,
+        coalesce_writes: bool = True
+    ):
         """
         Inicializa un cliente MCP.
         
         Args:
-            command (str): El comando para ejecutar el servidor MCP (e.j. "node", "python")
+            command (str): El comando para ejecutar el servidor MCP (e.j. "node", "python").
+                Con "python-inproc" el servidor de `args[0]` se importa y se ejecuta en memoria
             args (list[str]): Los argumentos para el comando (e.j. ["path/to/server.js"])
             env (Optional[Dict[str, str]]): Variables de entorno para el servidor
+            cache_ttl_seconds (float): Segundos durante los que se reutiliza la lista de herramientas
+            keepalive_interval (Optional[float]): Si se indica, segundos entre pings para
+                mantener viva la conexión mientras está inactiva
+            coalesce_writes (bool): Si es True, agrupa en una sola escritura los mensajes
+                enviados al servidor en la misma vuelta del bucle de eventos
         """
         self.server_params = StdioServerParameters(
             command=command,
@@ -41,55 +64,150 @@ class MCPClient:
         self.session = None
         self.read = None
         self.write = None
-        self._client_ctx = None
-        self._session_ctx = None
+        self._connection_task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._tools_cache = None
+        self._tools_cache_ts = 0.0
+        self._describe_cache = None
+        self._describe_cache_ts = 0.0
+        self.server_capabilities = None
+        self._pool_key = None
+        self._refs = 0
+        self._lifecycle_lock = asyncio.Lock()
+        self.keepalive_interval = keepalive_interval
+        self._warm_task: Optional[asyncio.Task] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+        if command == INPROC_COMMAND:
+            # Servidor Python importable: se ejecuta en el mismo proceso, sin stdio
+            self._transport = inprocess_client
+        else:
+            self._transport = coalescing_stdio_client if coalesce_writes else stdio_client
 
-    async def connect(self) -> bool:
+    async def connect(self, warm: bool = True) -> bool:
         """
         Establece conexión con el servidor MCP.
         
+        El transporte y la sesión se abren y se cierran dentro de una tarea propia
+        (ver `_run_connection`), así que cualquier tarea puede conectar o
+        desconectar el cliente: anyio exige salir de esos contextos desde la misma
+        tarea que entró en ellos.
+        
+        Args:
+            warm (bool): Si es True, pide la lista de herramientas en segundo plano
+                justo después de inicializar, para que la primera llamada a
+                `list_tools()` la encuentre lista
+        
         Returns:
             bool: True si la conexión fue exitosa, False en caso contrario
         """
+        ready = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._connection_task = asyncio.create_task(self._run_connection(ready))
         try:
-            self._client_ctx = stdio_client(self.server_params)
-            client = await self._client_ctx.__aenter__()
-            self.read, self.write = client
-            self._session_ctx = ClientSession(self.read, self.write)
-            self.session = await self._session_ctx.__aenter__()
-            await self.session.initialize()
-            logger.info("Conexión exitosa con servidor MCP")
-            return True
+            await ready
         except ConnectionError as e:
             logger.error(f"Error de conexión con servidor MCP: {e}")
             await self.disconnect()
             return False
-        except Exception as e:
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # Cancelación: no dejar el subproceso abierto
+                await self.disconnect()
+                raise
             logger.error(f"Error desconocido al conectar con servidor MCP: {e}")
             await self.disconnect()
             return False
+        
+        if warm:
+            self._warm_task = asyncio.create_task(self._warm_tools())
+        if self.keepalive_interval:
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+        logger.info("Conexión exitosa con servidor MCP")
+        return True
+
+    async def _run_connection(self, ready: asyncio.Future) -> None:
+        """
+        Mantiene abiertos el transporte y la sesión hasta que se pide cerrarlos
+        
+        Args:
+            ready (asyncio.Future): Se resuelve cuando la sesión está inicializada,
+                o con la excepción si la conexión falla
+        """
+        try:
+            async with self._transport(self.server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    init_result = await session.initialize()
+                    self.read, self.write, self.session = read, write, session
+                    self.server_capabilities = init_result.capabilities
+                    ready.set_result(None)
+                    await self._closing.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error(f"Error durante la desconexión: {e}")
+        finally:
+            self.session = None
+            self.read = None
+            self.write = None
+            if not ready.done():
+                ready.cancel()
 
     async def disconnect(self) -> None:
         """Cierra la conexión con el servidor MCP"""
-        try:
-            if self._session_ctx:
-                await self._session_ctx.__aexit__(None, None, None)
-                self._session_ctx = None
-                self.session = None
-            
-            if self._client_ctx:
-                await self._client_ctx.__aexit__(None, None, None)
-                self._client_ctx = None
-                self.read = None
-                self.write = None
-            
+        for task in (self._warm_task, self._keepalive_task):
+            if task and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._warm_task = None
+        self._keepalive_task = None
+        
+        connection_task, self._connection_task = self._connection_task, None
+        if connection_task is not None:
+            self._closing.set()
+            # Los errores al cerrar ya se registran en _run_connection
+            await asyncio.gather(connection_task, return_exceptions=True)
+            self.invalidate_tools_cache()
             logger.info("Desconexión exitosa del servidor MCP")
+
+    def invalidate_tools_cache(self) -> None:
+        """Descarta la lista de herramientas (y la descripción del servidor) en caché"""
+        self._tools_cache = None
+        self._tools_cache_ts = 0.0
+        self._describe_cache = None
+        self._describe_cache_ts = 0.0
+
+    async def _fetch_tools(self) -> Any:
+        """Consulta la lista de herramientas al servidor y la guarda en caché"""
+        tools = await self.session.list_tools()
+        logger.debug("Herramientas disponibles: %s", tools)
+        self._tools_cache = tools
+        self._tools_cache_ts = time.monotonic()
+        return tools
+
+    async def _warm_tools(self) -> None:
+        """Precarga la lista de herramientas; si falla, se consultará en el primer uso"""
+        try:
+            await self._fetch_tools()
         except Exception as e:
-            logger.error(f"Error durante la desconexión: {e}")
+            logger.warning(f"Error al precargar herramientas: {e}")
+
+    async def _keepalive(self) -> None:
+        """Envía un ping periódico para que el servidor no cierre la conexión inactiva"""
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await self.session.send_ping()
+            except Exception as e:
+                logger.warning(f"Error en el ping de keep-alive: {e}")
 
     async def list_tools(self) -> Any:
         """
-        Lista todas las herramientas disponibles en el servidor
+        Lista todas las herramientas disponibles en el servidor.
+        
+        El resultado se guarda en caché durante `cache_ttl_seconds` para evitar
+        una consulta al servidor en cada llamada.
         
         Returns:
             Any: Objeto con información sobre las herramientas disponibles
@@ -100,14 +218,98 @@ class MCPClient:
         """
         if not self.session:
             raise RuntimeError("Cliente no conectado. Llama a connect() primero")
+        if (
+            self._tools_cache is not None
+            and time.monotonic() - self._tools_cache_ts < self.cache_ttl_seconds
+        ):
+            return self._tools_cache
         try:
-            tools = await self.session.list_tools()
-            logger.debug(f"Herramientas disponibles: {tools}")
-            return tools
+            # Reutilizar la consulta de precalentamiento si sigue en curso
+            warm_task, self._warm_task = self._warm_task, None
+            if warm_task is not None and not warm_task.done():
+                await warm_task
+                if self._tools_cache is not None:
+                    return self._tools_cache
+            return await self._fetch_tools()
         except Exception as e:
             logger.error(f"Error al listar herramientas: {e}")
             raise
 
+    async def describe(self) -> Dict[str, Any]:
+        """
+        Obtiene de una vez todo lo que ofrece el servidor: herramientas, prompts,
+        recursos y plantillas de recursos.
+        
+        Si la lista de herramientas en caché incluye una herramienta agregada
+        `describe`, se usa esa única llamada; si no, todas las consultas
+        (herramientas incluidas) se envían en paralelo. Solo se piden los
+        prompts y recursos si el servidor declara esas capacidades. El resultado
+        se guarda en caché durante `cache_ttl_seconds`.
+        
+        Returns:
+            Dict[str, Any]: Claves "tools", "prompts", "resources" y "resource_templates"
+            
+        Raises:
+            RuntimeError: Si el cliente no está conectado
+        """
+        if not self.session:
+            raise RuntimeError("Cliente no conectado. Llama a connect() primero")
+        if (
+            self._describe_cache is not None
+            and time.monotonic() - self._describe_cache_ts < self.cache_ttl_seconds
+        ):
+            return self._describe_cache
+        
+        # La herramienta agregada solo se intenta si ya se sabe que existe; averiguarlo
+        # costaría una consulta más que enviar todos los listados a la vez
+        description = None
+        tools = self._tools_cache
+        if (
+            tools is not None
+            and time.monotonic() - self._tools_cache_ts < self.cache_ttl_seconds
+            and any(tool.name == "describe" for tool in tools.tools)
+        ):
+            try:
+                result = await self.session.call_tool("describe", {})
+                if not result.isError:
+                    data = json.loads(result.content[0].text)
+                    description = {"tools": tools}
+                    for key, model in (
+                        ("prompts", types.ListPromptsResult),
+                        ("resources", types.ListResourcesResult),
+                        ("resource_templates", types.ListResourceTemplatesResult),
+                    ):
+                        value = data.get(key)
+                        description[key] = model.model_validate(value) if value is not None else None
+            except Exception as e:
+                logger.warning(f"Error en la herramienta describe, se consultará por partes: {e}")
+        
+        if description is None:
+            capabilities = self.server_capabilities
+            has_prompts = capabilities is None or capabilities.prompts is not None
+            has_resources = capabilities is None or capabilities.resources is not None
+            
+            async def empty():
+                return None
+            
+            # list_tools responde desde su caché si está vigente
+            tools, prompts, resources, resource_templates = await asyncio.gather(
+                self.list_tools(),
+                self.session.list_prompts() if has_prompts else empty(),
+                self.session.list_resources() if has_resources else empty(),
+                self.session.list_resource_templates() if has_resources else empty(),
+            )
+            description = {
+                "tools": tools,
+                "prompts": prompts,
+                "resources": resources,
+                "resource_templates": resource_templates,
+            }
+        
+        self._describe_cache = description
+        self._describe_cache_ts = time.monotonic()
+        return description
+
     async def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
         """
         Ejecuta una herramienta específica con los argumentos proporcionados
@@ -126,21 +328,68 @@ class MCPClient:
         if not self.session:
             raise RuntimeError("Cliente no conectado. Llama a connect() primero")
         try:
-            logger.debug(f"Ejecutando herramienta {tool_name} con argumentos: {arguments}")
+            logger.debug("Ejecutando herramienta %s con argumentos: %s", tool_name, arguments)
             result = await self.session.call_tool(tool_name, arguments)
-            logger.debug(f"Resultado de la herramienta {tool_name}: {result}")
+            logger.debug("Resultado de la herramienta %s: %s", tool_name, result)
             return result
         except Exception as e:
             logger.error(f"Error al ejecutar herramienta {tool_name}: {e}")
             raise
 
     async def __aenter__(self) -> 'MCPClient':
-        """Soporte para context manager asíncrono (async with)"""
-        success = await self.connect()
-        if not success:
-            raise RuntimeError("Error al conectar con el servidor MCP")
+        """
+        Soporte para context manager asíncrono (async with).
+        
+        Lleva la cuenta de usuarios activos: solo el primero abre la conexión.
+        """
+        async with self._lifecycle_lock:
+            if self._refs == 0 or not self.session:
+                success = await self.connect()
+                if not success:
+                    raise RuntimeError("Error al conectar con el servidor MCP")
+            self._refs += 1
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        """Soporte para context manager asíncrono (async with)"""
-        await self.disconnect()
+        """
+        Soporte para context manager asíncrono (async with).
+        
+        La conexión solo se cierra cuando sale el último usuario.
+        """
+        async with self._lifecycle_lock:
+            self._refs = max(self._refs - 1, 0)
+            if self._refs > 0:
+                return
+            await self.disconnect()
+            if self._pool_key is not None and _MCP_POOL.get(self._pool_key) is self:
+                del _MCP_POOL[self._pool_key]
+
+
+def get_shared_mcp_client(
+    command: str,
+    args: list[str],
+    env: Optional[Dict[str, str]] = None
+) -> MCPClient:
+    """
+    Obtiene un cliente MCP compartido para el servidor indicado.
+    
+    Todas las llamadas con el mismo comando, argumentos y entorno devuelven la
+    misma instancia, de modo que el subproceso del servidor se lanza una sola
+    vez. La conexión se abre con el primer `async with` y se cierra cuando sale
+    el último, aunque cada usuario se ejecute en una tarea distinta.
+    
+    Args:
+        command (str): El comando para ejecutar el servidor MCP
+        args (list[str]): Los argumentos para el comando
+        env (Optional[Dict[str, str]]): Variables de entorno para el servidor
+        
+    Returns:
+        MCPClient: Cliente compartido (puede no estar conectado todavía)
+    """
+    key = (command, tuple(args), tuple(sorted(env.items())) if env else None)
+    client = _MCP_POOL.get(key)
+    if client is None:
+        client = MCPClient(command, args, env)
+        client._pool_key = key
+        _MCP_POOL[key] = client
+    return client
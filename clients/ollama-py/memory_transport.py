@@ -0,0 +1,80 @@
+import importlib
+import importlib.util
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+import anyio
+
+from mcp.client.stdio import StdioServerParameters
+from mcp.shared.memory import create_client_server_memory_streams
+
+# Comando especial que indica que el servidor se ejecuta en el mismo proceso
+INPROC_COMMAND = "python-inproc"
+
+
+def load_server(target: str) -> Any:
+    """
+    Importa un servidor MCP escrito en Python.
+
+    Args:
+        target (str): Ruta a un archivo .py o nombre de módulo, con un sufijo
+            opcional ":atributo" (por defecto "mcp"). Ej: "servers/calculator-py/server.py"
+
+    Returns:
+        Any: El servidor de bajo nivel (`mcp.server.Server`) listo para ejecutarse
+
+    Raises:
+        ValueError: Si el atributo no es un servidor MCP
+    """
+    module_ref, _, attr = target.partition(":")
+    attr = attr or "mcp"
+
+    if module_ref.endswith(".py"):
+        path = Path(module_ref).resolve()
+        spec = importlib.util.spec_from_file_location(f"_mcp_inproc_{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_ref)
+
+    server = getattr(module, attr)
+    # FastMCP envuelve al servidor de bajo nivel
+    server = getattr(server, "_mcp_server", server)
+    if not hasattr(server, "create_initialization_options"):
+        raise ValueError(f"{target} no es un servidor MCP")
+    return server
+
+
+@asynccontextmanager
+async def inprocess_client(server: StdioServerParameters):
+    """
+    Transporte en memoria para servidores MCP importables desde Python.
+
+    Ejecuta el servidor como una tarea del mismo proceso y lo conecta con
+    streams en memoria, sin lanzar un subproceso ni serializar por stdio.
+    Tiene la misma forma que `stdio_client`, por lo que se usa igual.
+
+    Args:
+        server (StdioServerParameters): Parámetros con `command == INPROC_COMMAND`
+            y el servidor a cargar en `args[0]` (ver `load_server`)
+
+    Yields:
+        Tuple: (read_stream, write_stream) para usar con `ClientSession`
+    """
+    mcp_server = load_server(server.args[0])
+
+    async with create_client_server_memory_streams() as (client_streams, server_streams):
+        server_read, server_write = server_streams
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(
+                lambda: mcp_server.run(
+                    server_read,
+                    server_write,
+                    mcp_server.create_initialization_options(),
+                )
+            )
+            try:
+                yield client_streams
+            finally:
+                tg.cancel_scope.cancel()
@@ -1,14 +1,27 @@
-import requests
-import json
+import aiohttp
+import msgspec
 import sys
 import os
 import logging
+import math
+import operator
 from enum import Enum
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Tuple, Union
 import asyncio
-from functools import lru_cache
+import hashlib
+import threading
+import ipaddress
+import time
+from collections import Counter, OrderedDict
+from urllib.parse import urlsplit
+from functools import partial
 
-from mcp_client import MCPClient
+try:
+    import uvloop
+except ImportError:  # uvloop no está disponible en Windows
+    uvloop = None
+
+from mcp_client import get_shared_mcp_client
 
 # Configurar logging
 logging.basicConfig(
@@ -26,26 +39,222 @@ class MessageRole(str, Enum):
 
 # Configuración
 DEFAULT_OLLAMA_URL = "http://localhost:11434"
-DEFAULT_MCP_SERVER_COMMAND = "node"
+DEFAULT_MCP_SERVER_COMMAND = os.environ.get("MCP_SERVER_COMMAND", "node")
 DEFAULT_MCP_SERVER_PATH = os.environ.get(
     "MCP_SERVER_PATH", 
     "/Users/alexyslozada/github.com/alexyslozada/mcp-course/servers/basic/dist/server.js"
 )
 DEFAULT_MODEL = "mistral:latest"
+DEFAULT_EMBEDDING_MODEL = "all-minilm"
+# Tiempo que Ollama mantiene el modelo (y su caché de prompt) cargado entre turnos
+DEFAULT_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+# Segundos máximos de espera entre dos fragmentos de una respuesta (no para la respuesta entera)
+DEFAULT_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "60"))
+# Veces que se tolera la misma llamada fallida antes de cortar el ciclo de herramientas
+MAX_REPEATED_TOOL_FAILURES = 3
+# Número máximo de herramientas enviadas al modelo por turno (0 = todas)
+DEFAULT_TOOL_TOP_K = int(os.environ.get("MCP_TOOL_TOP_K", "0"))
+# Número máximo de llamadas a funciones que se ejecutan a la vez en un turno
+DEFAULT_MAX_CONCURRENT_TOOLS = int(os.environ.get("MCP_MAX_CONCURRENT_TOOLS", "4"))
+# Caché de respuestas completas del modelo (0 segundos = desactivada). Está
+# desactivada por defecto: el modelo muestrea y repetir una respuesta solo tiene
+# sentido con opciones deterministas (temperature 0)
+DEFAULT_RESPONSE_CACHE_SIZE = 1000
+DEFAULT_RESPONSE_CACHE_TTL = float(os.environ.get("OLLAMA_RESPONSE_CACHE_TTL", "0"))
+
+
+class ToolCallFunction(msgspec.Struct):
+    """Función pedida por el modelo en una llamada a herramienta"""
+    name: str
+    # Los argumentos se guardan sin decodificar; OllamaAgent.decode_arguments los
+    # decodifica directamente al Struct de la herramienta
+    arguments: msgspec.Raw = msgspec.Raw(b"{}")
+
+
+class ToolCall(msgspec.Struct):
+    """Llamada a herramienta dentro de un mensaje de /api/chat"""
+    function: ToolCallFunction
+
+
+class ChatMessage(msgspec.Struct):
+    """Mensaje dentro de una línea de respuesta de /api/chat"""
+    content: Optional[str] = None
+    tool_calls: Optional[List[ToolCall]] = None
+
+
+class ChatChunk(msgspec.Struct):
+    """Línea NDJSON de /api/chat; solo se decodifican los campos que se usan"""
+    message: Optional[ChatMessage] = None
+
+
+_CHUNK_DECODER = msgspec.json.Decoder(ChatChunk)
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _format_json(obj: Any) -> str:
+    """Serializa a JSON indentado, para mostrar en los logs"""
+    return msgspec.json.format(msgspec.json.encode(obj), indent=2).decode()
+
+
+def _is_loopback(url: str) -> bool:
+    """Indica si la URL apunta a la propia máquina"""
+    host = urlsplit(url).hostname or ""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    """Normaliza un vector para que el producto punto sea la similitud coseno"""
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+class ResponseCache:
+    """
+    Caché LRU con expiración para las respuestas de texto del modelo
+    
+    La clave es un hash de todo lo que determina la respuesta (modelo,
+    historial, herramientas y opciones), así que un acierto solo ocurre cuando
+    se repite exactamente la misma conversación.
+    """
+    
+    def __init__(self, maxsize: int = DEFAULT_RESPONSE_CACHE_SIZE, ttl: float = DEFAULT_RESPONSE_CACHE_TTL):
+        """
+        Inicializa la caché
+        
+        Args:
+            maxsize: Número máximo de respuestas guardadas
+            ttl: Segundos que una respuesta se considera válida
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Calcula la clave a partir de los datos de la petición, sin depender del orden de las claves"""
+        return hashlib.sha256(msgspec.json.encode(parts, order="deterministic")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Busca una respuesta en la caché
+        
+        Args:
+            key: Clave calculada con `make_key`
+            
+        Returns:
+            str o None: La respuesta guardada, o None si no existe o ya expiró
+        """
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def put(self, key: str, value: str) -> None:
+        """Guarda una respuesta, descartando la menos usada si la caché está llena"""
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, int]:
+        """Devuelve los aciertos, fallos y entradas actuales de la caché"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
 
 class OllamaAPIClient:
     """Cliente para comunicarse con la API de Ollama"""
     
-    def __init__(self, base_url: str = DEFAULT_OLLAMA_URL):
+    def __init__(self, base_url: str = DEFAULT_OLLAMA_URL, cache_ttl: float = DEFAULT_RESPONSE_CACHE_TTL):
         """
         Inicializa el cliente de la API de Ollama
         
         Args:
             base_url: URL base de la API de Ollama
+            cache_ttl: Segundos que se reutiliza una respuesta de texto para una
+                petición idéntica (0 desactiva la caché)
         """
         self.base_url = base_url
+        self._http: Optional[aiohttp.ClientSession] = None
+        self.response_cache = ResponseCache(ttl=cache_ttl) if cache_ttl > 0 else None
+        self._tools_raw_source = None
+        self._tools_raw: Optional[msgspec.Raw] = None
+
+    async def open(self) -> None:
+        """Crea la sesión HTTP persistente (keep-alive) usada por todas las llamadas"""
+        if self._http is None or self._http.closed:
+            # Todas las peticiones van al mismo host: un pool de conexiones reutilizables.
+            # keepalive_timeout cubre el tiempo que el usuario tarda en escribir entre
+            # turnos (el valor por defecto de aiohttp, 15 s, cerraría la conexión).
+            # aiohttp ya desactiva Nagle (TCP_NODELAY) en cada conexión
+            if _is_loopback(self.base_url):
+                # Ollama local: las conexiones son baratas y no hay red que proteger,
+                # así que no se limita el pool y se mantienen abiertas más tiempo
+                connector = aiohttp.TCPConnector(limit=0, limit_per_host=0, keepalive_timeout=300)
+            else:
+                connector = aiohttp.TCPConnector(limit=32, limit_per_host=32, keepalive_timeout=60)
+            self._http = aiohttp.ClientSession(
+                base_url=self.base_url,
+                connector=connector,
+                # Las respuestas llegan en streaming y pueden durar minutos: el límite se
+                # aplica a cada lectura, no al total
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=DEFAULT_READ_TIMEOUT)
+            )
+
+    async def close(self) -> None:
+        """Cierra la sesión HTTP"""
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
 
-    def check_connection(self) -> bool:
+    def _encode_tools(self, tools: List[Dict[str, Any]]) -> msgspec.Raw:
+        """
+        Devuelve la lista de herramientas ya codificada a JSON
+        
+        La lista es la misma en casi todos los turnos, así que se codifica una
+        vez y se reutiliza mientras no cambie el objeto recibido.
+        
+        Args:
+            tools: Herramientas en formato de Ollama
+            
+        Returns:
+            msgspec.Raw: JSON que msgspec inserta tal cual al codificar la petición
+        """
+        if self._tools_raw is None or self._tools_raw_source is not tools:
+            self._tools_raw = msgspec.Raw(msgspec.json.encode(tools))
+            self._tools_raw_source = tools
+        return self._tools_raw
+
+    async def load_model(self, model: str) -> None:
+        """
+        Pide a Ollama que cargue un modelo en memoria sin generar nada
+        
+        Args:
+            model: Nombre del modelo a cargar
+            
+        Raises:
+            Exception: Si Ollama no puede cargar el modelo
+        """
+        await self.open()
+        # Un chat sin mensajes solo carga el modelo y lo mantiene durante keep_alive
+        body = msgspec.json.encode({"model": model, "messages": [], "keep_alive": DEFAULT_KEEP_ALIVE})
+        # Cargar un modelo en frío puede tardar más que el límite entre fragmentos
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=None)
+        async with self._http.post("/api/chat", data=body, headers=_JSON_HEADERS, timeout=timeout) as response:
+            await response.read()
+            if response.status != 200:
+                raise Exception(f"Error al cargar el modelo: {response.status}")
+
+    async def check_connection(self) -> bool:
         """
         Verifica la conexión con Ollama
         
@@ -55,41 +264,74 @@ class OllamaAPIClient:
         Raises:
             Exception: Si hay un error de conexión
         """
+        await self.open()
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
-            if response.status_code != 200:
-                raise Exception(f"Error al conectarse: {response.status_code}")
-            return True
-        except requests.exceptions.ConnectionError:
+            async with self._http.get("/api/tags") as response:
+                # Leer el cuerpo completo: aiohttp solo devuelve al pool (keep-alive)
+                # las conexiones cuya respuesta se consumió
+                await response.read()
+                if response.status != 200:
+                    raise Exception(f"Error al conectarse: {response.status}")
+                return True
+        except aiohttp.ClientConnectionError:
             raise Exception("No se pudo conectar al servidor de Ollama")
     
-    def list_models(self) -> List[Dict[str, Any]]:
+    async def list_models(self) -> List[Dict[str, Any]]:
         """
         Lista todos los modelos disponibles en Ollama
         
         Returns:
             List[Dict[str, Any]]: Lista de modelos disponibles
         """
+        await self.open()
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
-            if response.status_code == 200:
-                return response.json().get("models", [])
-            else:
-                logger.error(f"Error al obtener modelos: {response.status_code}")
-                return []
+            async with self._http.get("/api/tags") as response:
+                if response.status == 200:
+                    return msgspec.json.decode(await response.read()).get("models", [])
+                else:
+                    logger.error(f"Error al obtener modelos: {response.status}")
+                    await response.read()
+                    return []
         except Exception as e:
             logger.error(f"Error al listar modelos: {e}")
             return []
             
-    def chat(
+    async def embed(self, model: str, inputs: List[str]) -> List[List[float]]:
+        """
+        Genera embeddings para una lista de textos
+        
+        Args:
+            model: Nombre del modelo de embeddings
+            inputs: Textos a convertir
+            
+        Returns:
+            List[List[float]]: Un vector por cada texto, en el mismo orden
+            
+        Raises:
+            Exception: Si Ollama no puede generar los embeddings
+        """
+        await self.open()
+        body = msgspec.json.encode({"model": model, "input": inputs})
+        async with self._http.post("/api/embed", data=body, headers=_JSON_HEADERS) as response:
+            if response.status != 200:
+                await response.read()
+                raise Exception(f"Error al generar embeddings: {response.status}")
+            return msgspec.json.decode(await response.read())["embeddings"]
+
+    async def chat_stream(
         self, 
         model: str, 
         messages: List[Dict[str, Any]], 
         tools: List[Dict[str, Any]] = None,
         options: Optional[Dict[str, Any]] = None
-    ) -> Union[str, Dict[str, Any]]:
+    ) -> AsyncIterator[Union[str, Dict[str, Any]]]:
         """
-        Envía una solicitud de chat a Ollama
+        Envía una solicitud de chat a Ollama y entrega la respuesta a medida que llega
+        
+        Cada línea NDJSON se decodifica en cuanto se recibe. Si el modelo pide
+        llamar a funciones se entrega un único dict con las llamadas y el
+        stream termina ahí. Las respuestas de texto completas se guardan en
+        `response_cache`; las llamadas a funciones nunca se cachean.
         
         Args:
             model: Nombre del modelo a utilizar
@@ -97,74 +339,198 @@ class OllamaAPIClient:
             tools: Lista de herramientas disponibles para el modelo
             options: Opciones adicionales para la API de Ollama
             
-        Returns:
-            str o dict: Respuesta del modelo o información de llamada a función
+        Yields:
+            str o dict: Fragmentos del contenido o información de llamada a función
+            
+        Raises:
+            Exception: Si Ollama responde con un error
         """
         data = {
             "model": model,
             "messages": messages,
-            "stream": False
+            "stream": True,
+            "keep_alive": DEFAULT_KEEP_ALIVE
         }
         
-        if tools:
-            data["tools"] = tools
+        tools_raw = self._encode_tools(tools) if tools else None
+        if tools_raw is not None:
+            data["tools"] = tools_raw
             
         if options:
             data.update(options)
         
-        try:
-            response = requests.post(
-                f"{self.base_url}/api/chat", 
-                json=data, 
-                timeout=60
-            )
-            if response.status_code != 200:
-                logger.error(f"Error en la conversación: {response.status_code}")
-                logger.error(f"Respuesta: {json.dumps(response.json(), indent=2)}")
-                return None
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.make_key(model, messages, tools_raw, options)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Respuesta servida desde la caché: %s", self.response_cache.stats())
+                yield cached
+                return
+        
+        parts = []
+        await self.open()
+        # El cuerpo se codifica directamente a bytes, sin pasar por str
+        async with self._http.post("/api/chat", data=msgspec.json.encode(data), headers=_JSON_HEADERS) as response:
+            if response.status != 200:
+                raise Exception(f"Error en la conversación: {response.status} {await response.text()}")
+            
+            # Cada línea llega como bytes y se decodifica tal cual: msgspec acepta bytes y
+            # el salto de línea final, así que no hace falta .decode() ni .strip()
+            async for line in response.content:
+                if not line or line.isspace():
+                    continue
+                try:
+                    message = _CHUNK_DECODER.decode(line).message
+                except msgspec.DecodeError:
+                    logger.error(f"Error al decodificar la respuesta: {line}")
+                    continue
+                if message is None:
+                    continue
+                
+                # Verificar si hay llamadas a función
+                if message.tool_calls:
+                    # El resto del stream no se usa: cerrar ya la conexión para dejar de
+                    # recibir y que Ollama deje de generar, en lugar de esperar a que
+                    # quien consume el generador pida el siguiente elemento
+                    response.close()
+                    yield {
+                        "type": "function_call",
+                        "tool_calls": message.tool_calls
+                    }
+                    return
+                
+                if message.content:  # Evitar None y fragmentos vacíos
+                    parts.append(message.content)
+                    yield message.content
+        
+        if cache_key is not None and parts:
+            self.response_cache.put(cache_key, "".join(parts))
 
-            return self._process_response(response.text)
+    async def chat(
+        self, 
+        model: str, 
+        messages: List[Dict[str, Any]], 
+        tools: List[Dict[str, Any]] = None,
+        options: Optional[Dict[str, Any]] = None
+    ) -> Union[str, Dict[str, Any]]:
+        """
+        Envía una solicitud de chat a Ollama y espera la respuesta completa
+        
+        Args:
+            model: Nombre del modelo a utilizar
+            messages: Lista de mensajes para la conversación
+            tools: Lista de herramientas disponibles para el modelo
+            options: Opciones adicionales para la API de Ollama
+            
+        Returns:
+            str o dict: Respuesta del modelo o información de llamada a función
+        """
+        try:
+            return await self._process_response(self.chat_stream(model, messages, tools, options))
         except Exception as e:
             logger.error(f"Error al chatear: {e}")
             return None
     
-    def _process_response(self, response_text: str) -> Union[str, Dict[str, Any]]:
+    async def _process_response(self, stream: AsyncIterator[Union[str, Dict[str, Any]]]) -> Union[str, Dict[str, Any]]:
         """
-        Procesa la respuesta de texto de la API de Ollama
+        Reúne los fragmentos de `chat_stream` en una sola respuesta
         
         Args:
-            response_text: Texto de respuesta de Ollama
+            stream: Generador devuelto por `chat_stream`
             
         Returns:
             str o dict: Contenido de la respuesta o información de llamada a función
         """
-        lines = response_text.strip().split('\n')
-        full_response = ""
+        parts = []
+        function_call = None
         
-        for line in lines:
-            try:
-                resp_json = json.loads(line)
-                
-                # Verificar si hay una llamada a función
-                if "message" in resp_json and "tool_calls" in resp_json["message"]:
-                    function_call = resp_json["message"]["tool_calls"][0]
-                    if function_call:
-                        return {
-                            "type": "function_call",
-                            "function_call": function_call
-                        }
-                
-                # Si no es una llamada a función, acumular la respuesta normal
-                if "message" in resp_json and "content" in resp_json["message"]:
-                    content = resp_json["message"].get("content")
-                    if content:  # Evitar None
-                        full_response += content
-                    
-            except json.JSONDecodeError:
-                logger.error(f"Error al decodificar la respuesta: {line}")
-                continue
+        # Se consume el stream completo para que se cierre la respuesta HTTP;
+        # termina justo después de entregar una llamada a función
+        async for chunk in stream:
+            if isinstance(chunk, dict):
+                function_call = chunk
+            else:
+                parts.append(chunk)
         
-        return full_response
+        # Unir una sola vez al final evita copiar el texto acumulado en cada fragmento
+        return function_call or "".join(parts)
+
+
+def _mcp_to_ollama(mcp_tool) -> Dict[str, Any]:
+    """
+    Convierte una herramienta MCP al formato de herramientas de Ollama
+    
+    Args:
+        mcp_tool: Herramienta MCP (de `list_tools()`)
+        
+    Returns:
+        Dict[str, Any]: Definición de la herramienta para Ollama
+    """
+    return {
+        'type': 'function',
+        'function': {
+            'name': f"mcp_{mcp_tool.name}",
+            'description': getattr(mcp_tool, 'description', None) or f"MCP tool: {mcp_tool.name}",
+            'parameters': getattr(mcp_tool, 'inputSchema', None) or {'type': 'object'}
+        }
+    }
+
+
+# Tipos de JSON Schema -> tipos de Python para decodificar argumentos con msgspec
+_JSON_SCHEMA_TYPES = {
+    "string": str,
+    "number": float,
+    "integer": int,
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+
+def _schema_type(schema: Dict[str, Any]) -> Any:
+    """Traduce el tipo de una propiedad de JSON Schema; lo que no se reconoce queda como Any"""
+    type_name = schema.get("type")
+    field_type = _JSON_SCHEMA_TYPES.get(type_name, Any) if isinstance(type_name, str) else Any
+    if field_type is list and isinstance(schema.get("items"), dict):
+        return List[_schema_type(schema["items"])]
+    return field_type
+
+
+def _arguments_struct(mcp_tool) -> Optional[type]:
+    """
+    Crea un `msgspec.Struct` con los argumentos que declara una herramienta MCP
+    
+    Args:
+        mcp_tool: Herramienta MCP (de `list_tools()`)
+        
+    Returns:
+        type o None: Struct con un campo por propiedad del `inputSchema`, o None
+            si la herramienta no declara propiedades
+    """
+    schema = getattr(mcp_tool, 'inputSchema', None) or {}
+    properties = schema.get("properties")
+    if not isinstance(properties, dict) or not properties:
+        return None
+    
+    required = set(schema.get("required") or [])
+    fields = []
+    for name, prop in properties.items():
+        field_type = _schema_type(prop if isinstance(prop, dict) else {})
+        if name in required:
+            fields.append((name, field_type))
+        else:
+            fields.append((name, Optional[field_type], None))
+    
+    try:
+        # omit_defaults: los argumentos opcionales que no se enviaron no se reenvían al servidor.
+        # forbid_unknown_fields: si llegan claves fuera del esquema no se descartan, se
+        # decodifica sin convertir y el servidor decide si las acepta
+        return msgspec.defstruct(
+            f"{mcp_tool.name}_args", fields, kw_only=True, omit_defaults=True, forbid_unknown_fields=True
+        )
+    except (TypeError, ValueError):
+        return None
 
 
 class ToolManager:
@@ -173,10 +539,17 @@ class ToolManager:
     def __init__(self):
         """Inicializa el gestor de herramientas con las herramientas integradas"""
         self.built_in_tools = []
+        # Se guarda el objeto fuente (no su id): un id puede reutilizarse cuando
+        # el objeto anterior se libera y devolvería una conversión obsoleta
+        self._tools_cache_source = None
+        self._tools_cache = None
     
     def get_all_tools(self, mcp_tools=None) -> List[Dict[str, Any]]:
         """
-        Obtiene todas las herramientas disponibles (integradas + MCP)
+        Obtiene todas las herramientas disponibles (integradas + MCP).
+        
+        La conversión al formato de Ollama se reutiliza mientras no cambie
+        el objeto de herramientas MCP.
         
         Args:
             mcp_tools: Herramientas MCP disponibles
@@ -184,21 +557,17 @@ class ToolManager:
         Returns:
             List[Dict[str, Any]]: Lista completa de herramientas
         """
+        if self._tools_cache is not None and self._tools_cache_source is mcp_tools:
+            return self._tools_cache
+        
         tools = self.built_in_tools.copy()
         
         # Agregar herramientas MCP si están disponibles
-        if mcp_tools and hasattr(mcp_tools, 'tools'):
-            for mcp_tool in mcp_tools.tools:
-                # Convertir herramientas MCP al formato de herramientas de Ollama
-                tools.append({
-                    'type': 'function',
-                    'function': {
-                        'name': f"mcp_{mcp_tool.name}",
-                        'description': getattr(mcp_tool, 'description', f"MCP tool: {mcp_tool.name}"),
-                        'parameters': getattr(mcp_tool, 'inputSchema', {'type': 'object'})
-                    }
-                })
-                
+        if mcp_tools:
+            tools.extend([_mcp_to_ollama(mcp_tool) for mcp_tool in getattr(mcp_tools, 'tools', None) or []])
+        
+        self._tools_cache_source = mcp_tools
+        self._tools_cache = tools
         return tools
 
 
@@ -209,7 +578,11 @@ class OllamaAgent:
         self, 
         ollama_url: str = DEFAULT_OLLAMA_URL,
         mcp_command: str = DEFAULT_MCP_SERVER_COMMAND,
-        mcp_args: List[str] = None
+        mcp_args: List[str] = None,
+        tool_top_k: int = DEFAULT_TOOL_TOP_K,
+        embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+        prefetch: bool = False,
+        max_concurrent_tools: int = DEFAULT_MAX_CONCURRENT_TOOLS
     ):
         """
         Inicializa el agente de Ollama
@@ -218,24 +591,37 @@ class OllamaAgent:
             ollama_url: URL base de la API de Ollama
             mcp_command: Comando para ejecutar el servidor MCP
             mcp_args: Argumentos para el servidor MCP
+            tool_top_k: Si es mayor que 0, solo se envían al modelo las `tool_top_k`
+                herramientas más relevantes para el último mensaje del usuario
+            embedding_model: Modelo de Ollama usado para comparar mensajes y herramientas
+            prefetch: Si es True, conecta con el servidor MCP en `setup()`; si no, la
+                conexión se abre con el primer chat o la primera herramienta
+            max_concurrent_tools: Llamadas a funciones que pueden ejecutarse en paralelo
         """
         if mcp_args is None:
             mcp_args = [DEFAULT_MCP_SERVER_PATH]
             
         # Inicializar componentes
         self.ollama_client = OllamaAPIClient(ollama_url)
-        self.mcp_client = MCPClient(mcp_command, mcp_args)
+        self.mcp_client = get_shared_mcp_client(mcp_command, mcp_args)
         self.tool_manager = ToolManager()
+        self._tool_sem = asyncio.Semaphore(max(1, max_concurrent_tools))
         self.toolsMCP = None
-        
-        # Verificar conexión con Ollama
-        try:
-            self.ollama_client.check_connection()
-            logger.info("✅ Conexión establecida con Ollama")
-        except Exception as e:
-            logger.error(f"❌ Error al conectarse a Ollama: {e}")
-            logger.error("Asegúrate de que Ollama esté instalado y ejecutándose")
-            sys.exit(1)
+        self._tools_payload = self.tool_manager.get_all_tools()
+        self._tool_dispatch: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {}
+        self._tools_http: Optional[aiohttp.ClientSession] = None
+        self._arg_decoders: Dict[str, msgspec.json.Decoder] = {}
+        self._build_tool_dispatch()
+        self.tool_top_k = tool_top_k
+        self.embedding_model = embedding_model
+        self._tool_embeddings: Optional[List[List[float]]] = None
+        self._selected_for: Optional[str] = None
+        self._selected_tools: List[Dict[str, Any]] = []
+        self.prefetch = prefetch
+        self._mcp_lock = asyncio.Lock()
+        self._mcp_ready = False
+        self._mcp_entered = False
+        self._warmup_task: Optional[asyncio.Task] = None
 
     async def __aenter__(self):
         """Async context manager entry"""
@@ -244,23 +630,220 @@ class OllamaAgent:
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        if self.mcp_client:
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            await asyncio.gather(self._warmup_task, return_exceptions=True)
+            self._warmup_task = None
+        if self._mcp_entered:
+            self._mcp_entered = False
             await self.mcp_client.__aexit__(exc_type, exc_val, exc_tb)
+        if self._tools_http is not None:
+            await self._tools_http.close()
+            self._tools_http = None
+        await self.ollama_client.close()
 
     async def setup(self):
         """Configura el agente y las herramientas MCP"""
+        # Verificar la conexión con Ollama mientras arranca el servidor MCP
+        connection = asyncio.create_task(self.ollama_client.check_connection())
+        
+        if self.prefetch:
+            await self._ensure_mcp()
+        
+        try:
+            await connection
+            logger.info("✅ Conexión establecida con Ollama")
+        except Exception as e:
+            logger.error(f"❌ Error al conectarse a Ollama: {e}")
+            logger.error("Asegúrate de que Ollama esté instalado y ejecutándose")
+            await self.__aexit__(None, None, None)
+            sys.exit(1)
+    
+    def start_warmup(self, model: str):
+        """
+        Carga el modelo en segundo plano para que el primer turno no espere la carga
+        
+        Args:
+            model: Nombre del modelo que se usará en el chat
+        """
+        async def warmup():
+            try:
+                await self.ollama_client.load_model(model)
+                logger.info("✅ Modelo %s cargado", model)
+            except Exception as e:
+                logger.warning(f"No se pudo precargar el modelo {model}: {e}")
+        
+        self._warmup_task = asyncio.create_task(warmup())
+    
+    async def _ensure_mcp(self):
+        """
+        Conecta con el servidor MCP y carga sus herramientas la primera vez que se necesitan
+        
+        Si la conexión falla se continúa solo con las herramientas integradas.
+        """
+        if self._mcp_ready:
+            return
+        async with self._mcp_lock:
+            if self._mcp_ready:
+                return
+            try:
+                if self.mcp_client:
+                    await self.mcp_client.__aenter__()
+                    self._mcp_entered = True
+                    self.toolsMCP = await self.mcp_client.list_tools()
+                    logger.info("✅ Conexión establecida con servidor MCP")
+            except Exception as e:
+                logger.error(f"❌ Error al conectarse al servidor MCP: {e}")
+                self.toolsMCP = None
+            
+            # Las herramientas no cambian durante la sesión: se convierten una sola vez
+            self._tools_payload = self.tool_manager.get_all_tools(self.toolsMCP)
+            self._build_tool_dispatch()
+            await self._embed_tools()
+            self._mcp_ready = True
+    
+    async def refresh_tools(self):
+        """
+        Vuelve a consultar las herramientas del servidor MCP
+        
+        Es la única vía para actualizar la lista una vez cargada; la ejecución de
+        herramientas nunca la consulta de nuevo.
+        """
+        await self._ensure_mcp()
+        if not self._mcp_entered:
+            return
+        self.mcp_client.invalidate_tools_cache()
+        self.toolsMCP = await self.mcp_client.list_tools()
+        self._tools_payload = self.tool_manager.get_all_tools(self.toolsMCP)
+        self._build_tool_dispatch()
+        await self._embed_tools()
+    
+    def tools_http(self) -> aiohttp.ClientSession:
+        """
+        Sesión HTTP compartida por las herramientas integradas
+        
+        Se crea con la primera herramienta que la usa y reutiliza las conexiones
+        (keep-alive) entre llamadas, aunque cada llamada vaya a un host distinto.
+        
+        Returns:
+            aiohttp.ClientSession: Sesión que se cierra junto con el agente
+        """
+        if self._tools_http is None or self._tools_http.closed:
+            self._tools_http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=64, limit_per_host=16, keepalive_timeout=75),
+                timeout=aiohttp.ClientTimeout(total=60)
+            )
+        return self._tools_http
+    
+    async def _call_built_in(self, handler: Callable[..., Awaitable[str]], arguments: Dict[str, Any]) -> str:
+        """Ejecuta una herramienta integrada pasándole la sesión HTTP compartida"""
+        return await handler(arguments, self.tools_http())
+    
+    def _build_tool_dispatch(self):
+        """Asocia cada nombre de herramienta que ve el modelo con la coroutine que la ejecuta"""
+        dispatch = {name: partial(self._call_built_in, handler) for name, handler in BUILT_IN_FUNCTIONS.items()}
+        arg_types = {}
+        if self.toolsMCP:
+            for tool in self.toolsMCP.tools:
+                dispatch[f"mcp_{tool.name}"] = partial(self.execute_mcp_tool, tool.name)
+                arg_type = _arguments_struct(tool)
+                if arg_type is not None:
+                    arg_types[f"mcp_{tool.name}"] = arg_type
+        self._tool_dispatch = dispatch
+        # strict=False acepta números enviados como texto ("3"), algo frecuente en los modelos
+        self._arg_decoders = {name: msgspec.json.Decoder(arg_type, strict=False) for name, arg_type in arg_types.items()}
+    
+    def decode_arguments(self, function_name: str, arguments: Union[msgspec.Raw, str, bytes]) -> Dict[str, Any]:
+        """
+        Decodifica los argumentos de una llamada a función según el esquema de la herramienta
+        
+        Los argumentos se decodifican directamente al Struct de la herramienta,
+        que valida y convierte los tipos que declara su `inputSchema`. Si no
+        cumplen el esquema (o traen claves que no declara) se devuelven sin
+        convertir, para que sea el servidor quien los valide.
+        
+        Args:
+            function_name: Nombre de la función tal como la ve el modelo
+            arguments: Argumentos en JSON, tal como llegaron de Ollama
+            
+        Returns:
+            Dict[str, Any]: Argumentos listos para ejecutar la función
+            
+        Raises:
+            msgspec.DecodeError: Si los argumentos no son JSON válido
+        """
+        decoder = self._arg_decoders.get(function_name)
+        if decoder is not None:
+            try:
+                return msgspec.to_builtins(decoder.decode(arguments))
+            except msgspec.ValidationError as e:
+                logger.warning(f"Los argumentos de {function_name} no cumplen su esquema: {e}")
+        
+        decoded = msgspec.json.decode(arguments)
+        if isinstance(decoded, str):
+            # Algunos modelos envían el objeto de argumentos como texto JSON
+            return self.decode_arguments(function_name, decoded)
+        return decoded
+    
+    async def _embed_tools(self):
+        """Calcula los embeddings de las herramientas si el filtrado por relevancia está activo"""
+        self._tool_embeddings = None
+        self._selected_for = None
+        if self.tool_top_k <= 0 or len(self._tools_payload) <= self.tool_top_k:
+            return
+        
+        texts = [
+            f"{tool['function']['name']}: {tool['function'].get('description') or ''}"
+            for tool in self._tools_payload
+        ]
         try:
-            if self.mcp_client:
-                await self.mcp_client.__aenter__()
-                self.toolsMCP = await self.mcp_client.list_tools()
-                logger.info("✅ Conexión establecida con servidor MCP")
+            vectors = await self.ollama_client.embed(self.embedding_model, texts)
+            self._tool_embeddings = [_normalize(vector) for vector in vectors]
         except Exception as e:
-            logger.error(f"❌ Error al conectarse al servidor MCP: {e}")
-            self.toolsMCP = None
+            logger.warning(f"No se pudo activar el filtrado de herramientas, se enviarán todas: {e}")
+    
+    async def _select_tools(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Elige las herramientas a enviar al modelo en este turno
+        
+        Con el filtrado activo se devuelven las `tool_top_k` herramientas más
+        parecidas al último mensaje del usuario (en su orden original); la
+        selección se reutiliza mientras ese mensaje no cambie.
+        
+        Args:
+            messages: Historial de mensajes
             
-    def list_models(self):
+        Returns:
+            List[Dict[str, Any]]: Herramientas en formato de Ollama
+        """
+        if not self._tool_embeddings:
+            return self._tools_payload
+        
+        query = next(
+            (m.get("content") for m in reversed(messages) if m.get("role") == MessageRole.USER),
+            None
+        )
+        if not query:
+            return self._tools_payload
+        if query == self._selected_for:
+            return self._selected_tools
+        
+        try:
+            [vector] = await self.ollama_client.embed(self.embedding_model, [query])
+        except Exception as e:
+            logger.warning(f"Error al filtrar herramientas, se enviarán todas: {e}")
+            return self._tools_payload
+        
+        vector = _normalize(vector)
+        scores = [sum(map(operator.mul, vector, tool)) for tool in self._tool_embeddings]
+        top = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:self.tool_top_k]
+        self._selected_for = query
+        self._selected_tools = [self._tools_payload[i] for i in sorted(top)]
+        return self._selected_tools
+            
+    async def list_models(self):
         """Lista todos los modelos disponibles en Ollama"""
-        return self.ollama_client.list_models()
+        return await self.ollama_client.list_models()
     
     async def execute_mcp_tool(self, tool_name: str, arguments: Dict[str, Any]):
         """
@@ -279,13 +862,15 @@ class OllamaAgent:
         if not self.mcp_client or not self.toolsMCP:
             raise RuntimeError("MCP Client not connected or tools not available")
         
+        # El nombre ya viene del turno anterior del modelo: se llama directamente a la
+        # herramienta, sin volver a listar. La lista solo se actualiza con refresh_tools()
         try:
             return await self.mcp_client.execute_tool(tool_name, arguments)
         except Exception as e:
             logger.error(f"Error executing MCP tool {tool_name}: {e}")
             raise
 
-    def chat(self, model: str, messages: List[Dict[str, Any]], options: Optional[Dict[str, Any]] = None):
+    async def chat(self, model: str, messages: List[Dict[str, Any]], options: Optional[Dict[str, Any]] = None):
         """
         Realiza una conversación con el modelo
         
@@ -297,14 +882,40 @@ class OllamaAgent:
         Returns:
             str o dict: Respuesta del modelo o información de llamada a función
         """
-        # Obtener todas las herramientas disponibles
-        tools = self.tool_manager.get_all_tools(self.toolsMCP)
+        await self._ensure_mcp()
+        tools = await self._select_tools(messages)
+        return await self.ollama_client.chat(model, messages, tools, options)
+
+    async def chat_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Union[str, Dict[str, Any]]]:
+        """
+        Igual que `chat`, pero entrega la respuesta a medida que llega
         
-        # Obtener respuesta del modelo
-        return self.ollama_client.chat(model, messages, tools, options)
+        Args:
+            model: Nombre del modelo a utilizar
+            messages: Lista de mensajes para la conversación
+            options: Opciones adicionales para la API
+            
+        Yields:
+            str o dict: Fragmentos del contenido o información de llamada a función
+        """
+        await self._ensure_mcp()
+        tools = await self._select_tools(messages)
+        async for chunk in self.ollama_client.chat_stream(model, messages, tools, options):
+            yield chunk
+
+
+# Implementación de las herramientas integradas (ver ToolManager.built_in_tools):
+# nombre de la herramienta -> coroutine que recibe los argumentos y la sesión HTTP
+# compartida del agente (OllamaAgent.tools_http) y devuelve el resultado
+BUILT_IN_FUNCTIONS: Dict[str, Callable[[Dict[str, Any], aiohttp.ClientSession], Awaitable[str]]] = {}
 
 
-async def execute_function(function_name: str, function_args: dict, agent: OllamaAgent) -> str:
+async def execute_function(function_name: str, function_args: dict, agent: OllamaAgent) -> Tuple[str, bool]:
     """
     Ejecuta una función específica con sus argumentos
     
@@ -314,104 +925,254 @@ async def execute_function(function_name: str, function_args: dict, agent: Ollam
         agent: Agente de Ollama para acceso a herramientas MCP
     
     Returns:
-        str: Resultado de la ejecución de la función
+        Tuple[str, bool]: Resultado de la ejecución de la función e indicador de
+            si se trata de un error
     """
+    # Herramientas integradas y MCP se resuelven con la misma tabla (ver _build_tool_dispatch),
+    # que execute_functions completa al conectar con MCP
+    handler = agent._tool_dispatch.get(function_name)
+    if handler is None:
+        return f"Función {function_name} no implementada", True
+    
     try:
-        # Comprobar si es una herramienta MCP
-        if function_name.startswith("mcp_"):
-            # Extraer el nombre real de la herramienta sin el prefijo mcp_
-            actual_tool_name = function_name[4:]
-            try:
-                logger.info(f"Ejecutando herramienta MCP: {actual_tool_name}")
-                result = await agent.execute_mcp_tool(actual_tool_name, function_args)
-                logger.info(f"Resultado: {result}")
-                return str(result)
-            except Exception as e:
-                return f"Error ejecutando la herramienta MCP {actual_tool_name}: {e}"
-        
-        return f"Función {function_name} no implementada"
+        logger.info("Ejecutando función: %s", function_name)
+        result = await handler(function_args)
     except Exception as e:
-        logger.error(f"Error ejecutando la función {function_name}: {e}")
-        import traceback
-        traceback.print_exc()
-        return f"Error ejecutando la función: {e}"
+        logger.exception(f"Error ejecutando la función {function_name}: {e}")
+        return f"Error ejecutando la función {function_name}: {e}", True
+    # Las herramientas MCP informan sus fallos en CallToolResult.isError, sin lanzar excepción
+    return str(result), bool(getattr(result, "isError", False))
 
 
-async def process_function_call(model_name: str, response: dict, messages: list, agent: OllamaAgent):
+async def execute_functions(calls: List[Tuple[str, Dict[str, Any]]], agent: OllamaAgent) -> List[Tuple[str, bool]]:
     """
-    Procesa una llamada a función del modelo y maneja la respuesta
+    Ejecuta varias funciones solicitadas en el mismo turno del modelo
+    
+    Es el camino por lotes para las llamadas independientes de un turno: todas
+    (MCP e integradas) se ejecutan de forma concurrente, con a lo sumo
+    `max_concurrent_tools` en curso a la vez. Las llamadas MCP que arrancan
+    juntas viajan al servidor en una sola escritura (ver stdio_transport.py),
+    así que MCPClient no necesita un método de lote propio.
+    
+    Args:
+        calls: Pares (nombre de la función, argumentos)
+        agent: Agente de Ollama para acceso a herramientas MCP
+    
+    Returns:
+        List[Tuple[str, bool]]: Resultados (texto, es error) en el mismo orden
+            que `calls`, sin importar el orden en que terminen
+    """
+    # Punto de entrada de la ejecución: conecta con MCP (si aún no se hizo) y
+    # construye la tabla de herramientas que usa execute_function
+    await agent._ensure_mcp()
+    
+    async def run(function_name: str, function_args: Dict[str, Any]) -> Tuple[str, bool]:
+        async with agent._tool_sem:
+            return await execute_function(function_name, function_args, agent)
+    
+    # execute_function captura sus errores, así que gather no necesita return_exceptions
+    return list(await asyncio.gather(*(run(name, args) for name, args in calls)))
+
+
+async def stream_reply(model_name: str, messages: list, agent: OllamaAgent) -> Union[str, Dict[str, Any], None]:
+    """
+    Pide la siguiente respuesta al modelo y la muestra a medida que llega
     
     Args:
         model_name: Nombre del modelo
-        response: Respuesta del modelo con la llamada a función
         messages: Historial de mensajes
         agent: Agente de Ollama
+    
+    Returns:
+        str o dict: Texto completo ya mostrado, información de llamada a función,
+            o None si no se obtuvo respuesta
     """
+    parts = []
+    function_call = None
     try:
-        function_call = response["function_call"]
-        function_name = function_call["function"]["name"]
-        
-        # Intentar parsear los argumentos como JSON
-        try:
-            function_args_str = function_call["function"]["arguments"]
-            logger.debug(f"Arguments: {function_args_str}")
-            function_args = function_args_str if isinstance(function_args_str, dict) else json.loads(function_args_str)
-        except json.JSONDecodeError:
-            logger.error(f"Error decodificando argumentos JSON: {function_args_str}")
-            function_args = {}
-        
-        # Generar un ID único para la llamada a función
-        function_call_id = "call_" + str(len(messages))
-        
-        logger.info(f"\n{model_name} quiere llamar a la función: {function_name}")
-        logger.info(f"Con los argumentos: {json.dumps(function_args, indent=2)}")
-        
-        # Ejecutar la función correspondiente
-        function_result = await execute_function(function_name, function_args, agent)
-        if function_result is None:
-            logger.error(f"Error: Función {function_name} no implementada")
-            function_result = "Error: Función no implementada o falló la ejecución"
-        
-        logger.info(f"Resultado: {function_result}")
-        
-        # Agregar el resultado de la función al historial de mensajes
-        messages.append({
-            "role": MessageRole.ASSISTANT, 
-            "content": None,
-            "tool_calls": [
-                {
+        async for chunk in agent.chat_stream(model_name, messages):
+            if isinstance(chunk, dict):
+                function_call = chunk
+                continue
+            if not parts:
+                print(f"\n{model_name}: ", end="", flush=True)
+            print(chunk, end="", flush=True)
+            parts.append(chunk)
+    except Exception as e:
+        logger.error(f"Error al chatear: {e}")
+        return None
+    finally:
+        if parts:
+            print()
+    
+    return function_call or "".join(parts) or None
+
+
+async def process_function_call(
+    model_name: str,
+    response: dict,
+    messages: list,
+    agent: OllamaAgent
+):
+    """
+    Procesa las llamadas a función del modelo y maneja la respuesta
+    
+    Mientras el modelo siga pidiendo funciones se ejecutan y se le vuelve a
+    consultar. Si una misma llamada falla `MAX_REPEATED_TOOL_FAILURES` veces se
+    deja de consultar al modelo.
+    
+    Args:
+        model_name: Nombre del modelo
+        response: Respuesta del modelo con las llamadas a función
+        messages: Historial de mensajes
+        agent: Agente de Ollama
+    """
+    # Conteo de llamadas fallidas idénticas durante este turno
+    failures = Counter()
+    try:
+        while True:
+            tool_calls = []
+            calls = []
+            for index, function_call in enumerate(response["tool_calls"]):
+                function_name = function_call.function.name
+            
+                # Intentar parsear los argumentos como JSON
+                function_args_raw = function_call.function.arguments
+                try:
+                    logger.debug("Arguments: %s", bytes(function_args_raw))
+                    function_args = agent.decode_arguments(function_name, function_args_raw)
+                except msgspec.DecodeError:
+                    logger.error(f"Error decodificando argumentos JSON: {bytes(function_args_raw)}")
+                    function_args = {}
+            
+                # Generar un ID único para la llamada a función
+                function_call_id = f"call_{len(messages)}_{index}"
+            
+                logger.info("\n%s quiere llamar a la función: %s", model_name, function_name)
+                # Formatear los argumentos solo si el mensaje se va a registrar
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Con los argumentos: %s", _format_json(function_args))
+            
+                tool_calls.append({
                     "id": function_call_id,
                     "function": {
                         "name": function_name,
-                        "arguments": function_args_str
+                        # Raw se reenvía a Ollama tal como llegó, sin volver a codificarlo
+                        "arguments": function_args_raw
                     }
-                }
-            ]
-        })
-        
-        # Agregar el resultado de la función
-        messages.append({
-            "role": MessageRole.TOOL,
-            "tool_call_id": function_call_id,
-            "name": function_name,
-            "content": function_result
-        })
-        
-        # Obtener la respuesta final del modelo después de la llamada a función
-        logger.info("Obteniendo respuesta final después de la llamada a la función...")
-        final_response = agent.chat(model_name, messages)
-        if isinstance(final_response, dict) and final_response.get("type") == "function_call":
-            # Si hay otra llamada a función, procesarla recursivamente
-            await process_function_call(model_name, final_response, messages, agent)
-        elif isinstance(final_response, str):
-            print(f"\n{model_name}: {final_response}")
-            messages.append({"role": MessageRole.ASSISTANT, "content": final_response})
-        else:
-            logger.error("No se pudo obtener una respuesta final del modelo")
+                })
+                calls.append((function_name, function_args))
+        
+            function_results = await execute_functions(calls, agent)
+        
+            # Agregar las llamadas a función al historial de mensajes
+            messages.append({
+                "role": MessageRole.ASSISTANT, 
+                "content": None,
+                "tool_calls": tool_calls
+            })
+        
+            # Agregar el resultado de cada función
+            for tool_call, (function_result, is_error) in zip(tool_calls, function_results):
+                function_name = tool_call["function"]["name"]
+                logger.info("Resultado: %s", function_result)
+            
+                if is_error:
+                    failures[(function_name, msgspec.json.encode(tool_call["function"]["arguments"]), function_result)] += 1
+            
+                messages.append({
+                    "role": MessageRole.TOOL,
+                    "tool_call_id": tool_call["id"],
+                    "name": function_name,
+                    "content": function_result
+                })
+        
+            if failures and max(failures.values()) >= MAX_REPEATED_TOOL_FAILURES:
+                logger.error("El modelo repite una llamada a función que falla; se detiene el ciclo de herramientas")
+                print(f"\n{model_name}: No pude completar la solicitud porque una herramienta falla repetidamente.")
+                return
+        
+            # Obtener la respuesta final del modelo después de la llamada a función
+            logger.info("Obteniendo respuesta final después de la llamada a la función...")
+            final_response = await stream_reply(model_name, messages, agent)
+            if isinstance(final_response, dict) and final_response.get("type") == "function_call":
+                # Si hay otra llamada a función, procesarla en la siguiente vuelta
+                response = final_response
+                continue
+            elif isinstance(final_response, str):
+                # El texto ya se mostró mientras llegaba
+                messages.append({"role": MessageRole.ASSISTANT, "content": final_response})
+            else:
+                logger.error("No se pudo obtener una respuesta final del modelo")
+            return
     except Exception as e:
-        logger.error(f"Error procesando la llamada a función: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error procesando la llamada a función: {e}")
+
+
+# Bytes leídos de stdin que todavía no forman una línea completa
+_stdin_buffer = bytearray()
+
+
+def _read_stdin_line() -> str:
+    """
+    Lee una línea de stdin directamente del descriptor
+    
+    Se usa `os.read` en lugar de `input()`/`sys.stdin` porque no toma el lock
+    del búfer de stdin: un hilo bloqueado aquí no impide cerrar el intérprete.
+    
+    Returns:
+        str: La línea leída, sin el salto de línea
+        
+    Raises:
+        EOFError: Si la entrada estándar se cerró
+    """
+    while b"\n" not in _stdin_buffer:
+        chunk = os.read(sys.stdin.fileno(), 4096)
+        if not chunk:
+            if not _stdin_buffer:
+                raise EOFError
+            break
+        _stdin_buffer.extend(chunk)
+    line, _, rest = bytes(_stdin_buffer).partition(b"\n")
+    _stdin_buffer[:] = rest
+    return line.decode(sys.stdin.encoding or "utf-8", errors="replace").rstrip("\r")
+
+
+async def ainput(prompt: str) -> str:
+    """
+    Lee una línea de la consola sin bloquear el bucle de eventos
+    
+    La lectura se hace en un hilo daemon y no en el executor por defecto: al
+    terminar el programa (por ejemplo, tras Ctrl+C) no se espera a que el
+    usuario pulse Enter.
+    
+    Args:
+        prompt: Texto a mostrar antes de leer
+        
+    Returns:
+        str: La línea leída
+        
+    Raises:
+        EOFError: Si la entrada estándar se cerró
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+    
+    def read():
+        try:
+            line = _read_stdin_line()
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, line)
+    
+    print(prompt, end="", flush=True)
+    threading.Thread(target=read, daemon=True).start()
+    return await future
 
 
 async def interactive_chat(agent: OllamaAgent):
@@ -419,13 +1180,13 @@ async def interactive_chat(agent: OllamaAgent):
     model_name = DEFAULT_MODEL
     
     # Verificar si el modelo existe
-    models = agent.list_models()
-    model_exists = any(model["name"] == model_name for model in models)
-    if not model_exists:
+    models = await agent.list_models()
+    names = {model["name"] for model in models}
+    if model_name not in names:
         logger.warning(f"El modelo '{model_name}' no está disponible localmente.")
         logger.info("Modelos disponibles:")
-        for model in models:
-            logger.info(f" - {model['name']}")
+        for name in sorted(names):
+            logger.info(f" - {name}")
         
         # Usar el primer modelo disponible si hay alguno
         if models:
@@ -435,6 +1196,9 @@ async def interactive_chat(agent: OllamaAgent):
             logger.error("No hay modelos disponibles. Saliendo.")
             return
     
+    # Cargar el modelo mientras el usuario escribe su primer mensaje
+    agent.start_warmup(model_name)
+    
     # Iniciar chat
     messages = []
     messages.append({
@@ -445,7 +1209,8 @@ async def interactive_chat(agent: OllamaAgent):
     print("\nIniciando chat (escribe '/salir' para terminar)")
     while True:
         try:
-            user_message = input("\nTú: ")
+            # Mientras el usuario escribe, las tareas en segundo plano siguen avanzando
+            user_message = await ainput("\nTú: ")
             
             if user_message.lower() in ["/salir", "/exit", "/quit"]:
                 break
@@ -453,7 +1218,7 @@ async def interactive_chat(agent: OllamaAgent):
             messages.append({"role": MessageRole.USER, "content": user_message})
             
             print("Generando respuesta...")
-            response = agent.chat(model_name, messages)
+            response = await stream_reply(model_name, messages, agent)
             
             if response:
                 # Verificar si es una llamada a función
@@ -461,26 +1226,28 @@ async def interactive_chat(agent: OllamaAgent):
                     await process_function_call(model_name, response, messages, agent)
                 # Si es una respuesta normal (no es llamada a función)
                 elif isinstance(response, str):
-                    print(f"\n{model_name}: {response}")
                     messages.append({"role": MessageRole.ASSISTANT, "content": response})
                 else:
                     logger.error(f"Respuesta en formato desconocido: {response}")
             else:
                 logger.error("No se pudo obtener una respuesta del modelo")
-        except KeyboardInterrupt:
+        except EOFError:
+            break
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            # Con asyncio.run, Ctrl+C llega como cancelación de la tarea principal
             print("\nChat interrumpido por el usuario")
             break
         except Exception as e:
-            logger.error(f"Error en el chat: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error en el chat: {e}")
 
 
 async def main():
     """Función principal"""
-    async with OllamaAgent() as agent:
+    # prefetch: el servidor MCP arranca mientras se verifica la conexión con Ollama
+    async with OllamaAgent(prefetch=True) as agent:
         await interactive_chat(agent)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # uvloop reduce el coste de cada await en el transporte stdio y en las peticiones HTTP
+    (uvloop.run if uvloop else asyncio.run)(main())
@@ -0,0 +1,129 @@
+import sys
+from contextlib import asynccontextmanager
+from typing import TextIO
+
+import anyio
+import anyio.lowlevel
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+from anyio.streams.text import TextReceiveStream
+
+import mcp.types as types
+from mcp.client.stdio import (
+    StdioServerParameters,
+    _create_platform_compatible_process,
+    _get_executable_command,
+    get_default_environment,
+)
+from mcp.client.stdio.win32 import terminate_windows_process
+
+
+@asynccontextmanager
+async def coalescing_stdio_client(server: StdioServerParameters, errlog: TextIO = sys.stderr):
+    """
+    Transporte stdio equivalente a `mcp.client.stdio.stdio_client`, pero que
+    agrupa las escrituras hacia el servidor.
+
+    Los mensajes JSON-RPC que se envían en la misma vuelta del bucle de eventos
+    (por ejemplo, varias consultas lanzadas con `asyncio.gather`) se escriben en
+    el stdin del proceso con una sola llamada en lugar de una por mensaje.
+
+    Reutiliza funciones internas de `mcp.client.stdio` y supone que el stream
+    transporta `JSONRPCMessage`, como en mcp 1.6; por eso pyproject.toml limita
+    la dependencia a `mcp<1.7`. Para subir de versión hay que revisar este
+    módulo contra el `stdio_client` nuevo.
+
+    Args:
+        server (StdioServerParameters): Parámetros para lanzar el servidor
+        errlog (TextIO): Destino del stderr del servidor
+
+    Yields:
+        Tuple: (read_stream, write_stream) para usar con `ClientSession`
+    """
+    read_stream: MemoryObjectReceiveStream[types.JSONRPCMessage | Exception]
+    read_stream_writer: MemoryObjectSendStream[types.JSONRPCMessage | Exception]
+
+    write_stream: MemoryObjectSendStream[types.JSONRPCMessage]
+    write_stream_reader: MemoryObjectReceiveStream[types.JSONRPCMessage]
+
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+
+    process = await _create_platform_compatible_process(
+        command=_get_executable_command(server.command),
+        args=server.args,
+        env=(
+            {**get_default_environment(), **server.env}
+            if server.env is not None
+            else get_default_environment()
+        ),
+        errlog=errlog,
+        cwd=server.cwd,
+    )
+
+    async def stdout_reader():
+        assert process.stdout, "Opened process is missing stdout"
+
+        try:
+            async with read_stream_writer:
+                buffer = ""
+                async for chunk in TextReceiveStream(
+                    process.stdout,
+                    encoding=server.encoding,
+                    errors=server.encoding_error_handler,
+                ):
+                    lines = (buffer + chunk).split("\n")
+                    buffer = lines.pop()
+
+                    for line in lines:
+                        try:
+                            message = types.JSONRPCMessage.model_validate_json(line)
+                        except Exception as exc:
+                            await read_stream_writer.send(exc)
+                            continue
+
+                        await read_stream_writer.send(message)
+        except anyio.ClosedResourceError:
+            await anyio.lowlevel.checkpoint()
+
+    async def stdin_writer():
+        assert process.stdin, "Opened process is missing stdin"
+
+        try:
+            async with write_stream_reader:
+                async for message in write_stream_reader:
+                    # Ceder una vuelta para que los demás envíos del mismo tick queden en espera
+                    await anyio.lowlevel.checkpoint()
+                    frames = [message]
+                    while True:
+                        try:
+                            frames.append(write_stream_reader.receive_nowait())
+                        except (anyio.WouldBlock, anyio.EndOfStream):
+                            break
+
+                    payload = "".join(
+                        frame.model_dump_json(by_alias=True, exclude_none=True) + "\n"
+                        for frame in frames
+                    )
+                    await process.stdin.send(
+                        payload.encode(
+                            encoding=server.encoding,
+                            errors=server.encoding_error_handler,
+                        )
+                    )
+        except anyio.ClosedResourceError:
+            await anyio.lowlevel.checkpoint()
+
+    async with (
+        anyio.create_task_group() as tg,
+        process,
+    ):
+        tg.start_soon(stdout_reader)
+        tg.start_soon(stdin_writer)
+        try:
+            yield read_stream, write_stream
+        finally:
+            # Terminar el proceso para no dejar servidores huérfanos
+            if sys.platform == "win32":
+                await terminate_windows_process(process)
+            else:
+                process.terminate()
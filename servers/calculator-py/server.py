@@ -1,33 +1,36 @@
+from operator import add, mul, sub, truediv
+
 from mcp.server.fastmcp import FastMCP
 
 mcp = FastMCP("Calculator MCP Server")
 
-def add(a: float, b: float) -> float:
-    return float(a + b)
-
-def subtract(a: float, b: float) -> float:
-    return float(a - b)
+_OPS = {
+    "add": add,
+    "subtract": sub,
+    "multiply": mul,
+    "divide": truediv,
+}
 
-def multiply(a: float, b: float) -> float:
-    return float(a * b)
-
-def divide(a: float, b: float) -> float:
-    if b == 0:
+@mcp.tool()
+def calculate(a: float, b: float, operation: str) -> float:
+    op = _OPS.get(operation)
+    if op is None:
+        raise ValueError("Operación no válida")
+    if op is truediv and b == 0:
         raise ValueError("No se puede dividir por cero")
-    return float(a / b)
+    return float(op(a, b))
 
 @mcp.tool()
-def calculate(a: float, b: float, operation: str) -> float:
-    if operation == "add":
-        return add(a, b)
-    elif operation == "subtract":
-        return subtract(a, b)
-    elif operation == "multiply":
-        return multiply(a, b)
-    elif operation == "divide":
-        return divide(a, b)
-    else:
+def calculate_batch(a: list[float], b: list[float], operation: str) -> list[float]:
+    op = _OPS.get(operation)
+    if op is None:
         raise ValueError("Operación no válida")
+    if len(a) != len(b):
+        raise ValueError("Las listas deben tener la misma longitud")
+    if op is truediv and 0 in b:
+        raise ValueError("No se puede dividir por cero")
+    # map aplica el operador elemento a elemento sin un bucle en Python
+    return list(map(float, map(op, a, b)))
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')